@@ -1,20 +1,41 @@
+from functools import lru_cache
+from math import gcd, hypot
+from typing import Final
+
 import numpy as np
 
-G = 39.476926421373
+G: Final[float] = 39.476926421373
+
+# maximo de iteraciones de Newton en mindist_r3p
+_NEWTON_MAXITER = 50
+
 
+def _r3p_scalar(x, a, b, c):
+    return -c / (a * x + b)
 
-def r3p(x, res):
+
+def r3p(x, res, out=None):
+    """
+    Returns the 3P-MMR curve y = -c / (a*x + b) evaluated at x.
+    If out (float ndarray with the shape of x) is given, the curve is
+    written into it in place, without temporary arrays.
+    """
     a, b, c = res
-    r3p = -c / (a * x + b)
+    if out is None:
+        r3p = _r3p_scalar(x, a, b, c)
+    else:
+        r3p = np.multiply(x, a, out=out)
+        r3p += b
+        np.divide(-c, r3p, out=r3p)
+    # con b == 0 la singularidad es x = 0, fuera de todo dominio de
+    #  cocientes de periodos (x > 0)
+    if b == 0 or np.ndim(x) == 0 or len(x) <= 1:
+        return r3p
 
     # fix singularity
     sing = -b / a
-    if np.ndim(x) > 0:
-        if len(x) > 1:
-            if sing >= np.min(x) and sing <= np.max(x):
-                dif = np.abs(x - sing)
-                minind = np.argmin(dif)
-                r3p[minind] = np.nan
+    if x.min() <= sing <= x.max():
+        r3p[np.argmin(np.abs(x - sing))] = np.nan
     return r3p
 
 
@@ -24,140 +45,107 @@ def rmm_in_area(
     """
     Returns list of 3P-MMR as well as 2P-MMR in the
     x- and y- axes, respectively.
+    Results are cached; each call returns new lists.
     """
-    # ------------- 3P-MMR
     l1x, l2x, l1y, l2y = lims
-    r3pl = []
-
-    intl = np.flip(np.arange(-r3p_maxint, r3p_maxint + 1))
-
-    for i in intl:
-        i0 = i
-        for j in intl:
-            j0 = j
-            for k in intl:
-                i = i0
-                j = j0
-
-                if abs(i + j + k) > r3p_order:
-                    continue
-
-                if [i, j, k].count(0) > 1:
-                    continue
-
-                if (i == 0) or (k == 0):  # adjacent 2p-mmr
-                    continue
-
-                if j == 0:  # take (i,0,-k) over (-i,0,k)
-                    if (i > 0) & (k < 0):
-                        pass
-                    else:
-                        continue
-
-                if (i < 0) & (j > 0) & (k < 0):
-                    i *= -1
-                    j *= -1
-                    k *= -1
-
-                fac = np.gcd.reduce([i, j, k])
-                i //= fac
-                j //= fac
-                k //= fac
+    found = _rmm_in_area(
+        l1x, l2x, l1y, l2y, r3p_order, r3p_maxint, r2p, r2p_order, r2p_maxint
+    )
+    if not r2p:
+        return found.tolist()
+
+    r3pl, r2px, r2py = found
+    if r2py is r2px:
+        r2px = r2py = r2px.tolist()
+    else:
+        r2px = r2px.tolist()
+        r2py = r2py.tolist()
+    return [r3pl.tolist(), r2px, r2py]
 
-                if [i, j, k] in r3pl:
-                    continue
 
-                if (-j / i < l1x) or (
-                    -j / i > l2x
-                ):  # without singularities in domain
-                    # si cruza el eje izquierdo
-                    if (-k / (i * l1x + j) >= l1y) and (
-                        -k / (i * l1x + j) <= l2y
-                    ):
-                        pass
-
-                    # si cruza el eje derecho
-                    elif (-k / (i * l2x + j) >= l1y) and (
-                        -k / (i * l2x + j) <= l2y
-                    ):
-                        pass
-
-                    # si cruza el eje de abajo
-                    elif (-(j * l1y + k) / i / l1y >= l1x) and (
-                        -(j * l1y + k) / i / l1y <= l2x
-                    ):
-                        pass
-
-                    # no cruza ningun eje
-                    else:
-                        continue
-
-                else:  # with singularities in domain
-                    # si cruza el eje izquierdo
-                    if (
-                        (-j / i != l1x)
-                        and (-k / (i * l1x + j) >= l1y)
-                        and (-k / (i * l1x + j) <= l2y)
-                    ):
-                        pass
-
-                    # si cruza el eje derecho
-                    elif (
-                        (-j / i != l2x)
-                        and (-k / (i * l2x + j) >= l1y)
-                        and (-k / (i * l2x + j) <= l2y)
-                    ):
-                        pass
-
-                    # si cruza el eje de abajo
-                    elif (
-                        (-(j * l1y + k) / i / l1y >= l1x)
-                        and (-(j * l1y + k) / i / l1y < -j / i)
-                    ) or (
-                        (-(j * l1y + k) / i / l1y > -j / i)
-                        and (-(j * l1y + k) / i / l1y <= l2x)
-                    ):
-                        pass
-
-                    # no cruza ningun eje
-                    else:
-                        continue
-
-                r3pl.append([i, j, k])
+@lru_cache(maxsize=128)
+def _rmm_in_area(
+    l1x, l2x, l1y, l2y, r3p_order, r3p_maxint, r2p, r2p_order, r2p_maxint
+):
+    """
+    Cached search of rmm_in_area. Returns read-only int arrays of shape
+    (n, 3) for 3P-MMR and (n, 2) for 2P-MMR.
+    """
+    # ------------- 3P-MMR
+    intl = np.flip(np.arange(-r3p_maxint, r3p_maxint + 1))
+    i, j, k = (
+        ind.ravel() for ind in np.meshgrid(intl, intl, intl, indexing="ij")
+    )
+
+    keep = np.abs(i + j + k) <= r3p_order
+    keep &= (i != 0) & (k != 0)  # adjacent 2p-mmr
+    keep &= (j != 0) | ((i > 0) & (k < 0))  # take (i,0,-k) over (-i,0,k)
+    i, j, k = i[keep], j[keep], k[keep]
+
+    flip = (i < 0) & (j > 0) & (k < 0)
+    i[flip] *= -1
+    j[flip] *= -1
+    k[flip] *= -1
+
+    # np.gcd ya usa valores absolutos; fac >= 1 porque i != 0
+    fac = np.gcd(np.gcd(i, j), k)
+    r3pl = np.stack([i // fac, j // fac, k // fac], axis=1)
+
+    # sin repetidos, en el orden en que aparecen
+    _, first = np.unique(r3pl, axis=0, return_index=True)
+    r3pl = r3pl[np.sort(first)]
+    i, j, k = r3pl.T
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sing = -j / i
+        y_l1x = -k / (i * l1x + j)
+        y_l2x = -k / (i * l2x + j)
+        x_l1y = -(j * l1y + k) / (i * l1y)
+
+    # si cruza el eje izquierdo, derecho o de abajo
+    cross_l = (y_l1x >= l1y) & (y_l1x <= l2y)
+    cross_r = (y_l2x >= l1y) & (y_l2x <= l2y)
+    cross_b = (x_l1y >= l1x) & (x_l1y <= l2x)
+
+    # with singularities in domain
+    with_sing = (sing >= l1x) & (sing <= l2x)
+    cross_l &= ~with_sing | (sing != l1x)
+    cross_r &= ~with_sing | (sing != l2x)
+    cross_b &= ~with_sing | (x_l1y != sing)
+
+    r3pl = r3pl[cross_l | cross_r | cross_b]
+    r3pl.flags.writeable = False
 
     # ------------- 2P-MMR
     if r2p:
         r2px = []
         r2py = []
 
-        intl = np.arange(1, r2p_maxint + 1)
         eq_ax = (l1y == l1x) & (l2y == l2x)
-        for i in intl:
-            i0 = i
-            for j in intl:
-                i = i0
-
-                if j >= i:
-                    continue
+        # solo pares reducidos (i, j) con j < i: no hay repetidos
+        for i in range(2, r2p_maxint + 1):
+            for j in range(1, i):
                 if i - j > r2p_order:
                     continue
+                if gcd(i, j) != 1:
+                    continue
 
-                fac = np.gcd.reduce([i, j])
-                i //= fac
-                j //= fac
-
-                if (i / j >= l1x) & (i / j <= l2x):
-                    if [i, j] not in r2px:
-                        r2px.append([i, j])
+                ratio = i / j
+                if (ratio >= l1x) & (ratio <= l2x):
+                    r2px.append((i, j))
 
                 if not eq_ax:
-                    if (i / j >= l1y) & (i / j <= l2y):
-                        if [i, j] not in r2py:
-                            r2py.append([i, j])
+                    if (ratio >= l1y) & (ratio <= l2y):
+                        r2py.append((i, j))
+        r2px = np.array(r2px, dtype=int).reshape(-1, 2)
+        r2px.flags.writeable = False
         if eq_ax:
             r2py = r2px
+        else:
+            r2py = np.array(r2py, dtype=int).reshape(-1, 2)
+            r2py.flags.writeable = False
 
-        return [r3pl, r2px, r2py]
+        return (r3pl, r2px, r2py)
     else:
         return r3pl
 
@@ -178,30 +166,214 @@ def r3p_label(res, ax, lims=False):
     else:
         l1x, l2x = ax.get_xlim()
         l1y, l2y = ax.get_ylim()
+    # en float64, r(x) en la singularidad da inf y no ZeroDivisionError
+    l1x, l2x, l1y, l2y = np.array([l1x, l2x, l1y, l2y], dtype=float)
 
     # cruza por eje derecho
-    if (r(l2x) >= l1y) & (r(l2x) <= l2y):
-        text = str(a) + " " + str(b) + " " + str(c)
+    y = r(l2x)
+    if (y >= l1y) & (y <= l2y):
+        text = f"{a} {b} {c}"
 
-        y = r(l2x)
         y_ax = (y - l1y) / (l2y - l1y)
 
         ax.text(1.01, y_ax, text, transform=ax.transAxes)
+        return ()
 
     # cruza por eje de arriba
-    elif (rinv(l2y) >= l1x) & (rinv(l2y) < l2x):
-        text = " " + str(a) + "\n" + str(b) + "\n " + str(c)
+    x = rinv(l2y)
+    if (x >= l1x) & (x < l2x):
+        text = f" {a}\n{b}\n {c}"
 
-        x = rinv(l2y)
         x_ax = (x - l1x) / (l2x - l1x)
         ax.text(x_ax - 0.015, 1.02, text, transform=ax.transAxes)
 
     # no cruza por ninguno de esos
     else:
-        print("Warning: " + str(res) + " does not cross right or top axis")
+        print(f"Warning: {res} does not cross right or top axis")
     return ()
 
 
+def _mindist_r3p_point(nnxi, nnyi, a, b, c, res):
+    """
+    Newton search of the point on the left wing of the 3P-MMR (a, b, c)
+    closest to (nnxi, nnyi). Works on plain floats, with the curve
+    inlined. Returns (mindist, x0, y0).
+    """
+    x0 = nnxi - 0.5
+    y0 = _r3p_scalar(x0, a, b, c)
+
+    dx = 1
+    # estado de atasco en la singularidad:
+    #  0 ninguno, 1 primera pasada, 2 xstuck guardado, 3 no converge
+    stuck = 0
+    xstuck = np.nan
+
+    # solo dependen de la resonancia
+    singu = -b / a
+    x_reset = singu - 5e-2
+    ac = a / c
+    ac2 = ac * ac
+    ac3 = ac * ac2
+
+    niter = 0
+    while abs(dx) > res:
+        if niter == _NEWTON_MAXITER:
+            stuck = 3
+            break
+        niter += 1
+
+        y2 = y0 * y0
+        y3 = y2 * y0
+        y4 = y2 * y2
+
+        # g0 = dD^2/dx y sus derivadas, con los factores comunes agrupados
+        g0 = 2 * (x0 - nnxi + ac * y2 * (y0 - nnyi))
+        d1g0 = 2 + ac2 * y3 * (6 * y0 - 4 * nnyi)
+        d2g0 = ac3 * y4 * (24 * y0 - 12 * nnyi)
+
+        dx = 2 * g0 * d1g0 / (2 * d1g0**2 - g0 * d2g0)
+
+        x0 = x0 - dx
+        y0 = -c / (a * x0 + b)  # _r3p_scalar, inline
+
+        # solo calculo la distancia al ala izquierda de la resonancia
+        if (x0 >= singu) and (b != 0):
+            if stuck == 2 and x0 == xstuck:
+                stuck = 3
+                break
+            if stuck == 1:
+                stuck = 2
+                xstuck = x0
+            elif stuck == 0:
+                stuck = 1
+            x0 = x_reset
+            y0 = _r3p_scalar(x0, a, b, c)
+            dx = 1
+
+    if stuck == 3:
+        return _mindist_r3p_sweep(nnxi, nnyi, a, b, c, res)
+
+    mindist = hypot(nnxi - x0, nnyi - y0)
+    return (mindist, x0, y0)
+
+
+def _mindist_r3p_sweep(nnxi, nnyi, a, b, c, res):
+    """
+    Fallback of _mindist_r3p_point when Newton does not converge. A coarse
+    sweep of x in [1, singu) brackets the minimum distance, which is then
+    refined by golden-section search down to res. Returns (mindist, x0, y0).
+    """
+
+    def dist2(x):
+        return (nnxi - x) ** 2 + (nnyi - _r3p_scalar(x, a, b, c)) ** 2
+
+    dom = np.linspace(1, -b / a - 1e-5, 1024)
+    argmin = np.argmin(dist2(dom))
+    lo = float(dom[max(argmin - 1, 0)])
+    hi = float(dom[min(argmin + 1, len(dom) - 1)])
+    if lo > hi:
+        lo, hi = hi, lo
+
+    invphi = (5**0.5 - 1) / 2
+    x1 = hi - invphi * (hi - lo)
+    x2 = lo + invphi * (hi - lo)
+    f1 = dist2(x1)
+    f2 = dist2(x2)
+    while hi - lo > res:
+        if f1 < f2:
+            hi, x2, f2 = x2, x1, f1
+            x1 = hi - invphi * (hi - lo)
+            f1 = dist2(x1)
+        else:
+            lo, x1, f1 = x1, x2, f2
+            x2 = lo + invphi * (hi - lo)
+            f2 = dist2(x2)
+
+    # el minimo puede estar en un extremo del dominio
+    x0 = min((lo, (lo + hi) / 2, hi), key=dist2)
+    y0 = _r3p_scalar(x0, a, b, c)
+    mindist = hypot(nnxi - x0, nnyi - y0)
+    return (mindist, x0, y0)
+
+
+def _mindist_r3p_array(nnx, nny, a, b, c, res):
+    """
+    Vectorized version of _mindist_r3p_point over float arrays nnx, nny and
+    res. Newton is iterated only on the points that have not converged yet.
+    Returns (mindist, x0, y0) arrays.
+    """
+    x0 = nnx - 0.5
+    y0 = _r3p_scalar(x0, a, b, c)
+
+    # estado de atasco en la singularidad, por punto:
+    #  0 ninguno, 1 primera pasada, 2 xstuck guardado
+    stuck = np.zeros(len(nnx), dtype=np.int8)
+    xstuck = np.full(len(nnx), np.nan)
+    no_conv = np.zeros(len(nnx), dtype=bool)
+
+    # solo dependen de la resonancia
+    singu = -b / a
+    x_reset = singu - 5e-2
+    y_reset = _r3p_scalar(x_reset, a, b, c)
+    ac = a / c
+    ac2 = ac * ac
+    ac3 = ac * ac2
+
+    act = np.flatnonzero(res < 1)
+    for _ in range(_NEWTON_MAXITER):
+        if not act.size:
+            break
+        xa = x0[act]
+        ya = y0[act]
+        nnxa = nnx[act]
+        nnya = nny[act]
+
+        y2 = ya * ya
+        y3 = y2 * ya
+        y4 = y2 * y2
+
+        g0 = 2 * (xa - nnxa + ac * y2 * (ya - nnya))
+        d1g0 = 2 + ac2 * y3 * (6 * ya - 4 * nnya)
+        d2g0 = ac3 * y4 * (24 * ya - 12 * nnya)
+
+        dx = 2 * g0 * d1g0 / (2 * d1g0**2 - g0 * d2g0)
+
+        xa = xa - dx
+        ya = _r3p_scalar(xa, a, b, c)
+
+        # solo calculo la distancia al ala izquierda de la resonancia
+        if b != 0:
+            past = xa >= singu
+            sta = stuck[act]
+            nc = past & (sta == 2) & (xa == xstuck[act])
+            rec = past & (sta == 1)
+            xstuck[act[rec]] = xa[rec]
+            sta[rec] = 2
+            sta[past & (sta == 0)] = 1
+            stuck[act] = sta
+            no_conv[act[nc]] = True
+
+            reset = past & ~nc
+            xa[reset] = x_reset
+            ya[reset] = y_reset
+            dx[reset] = 1
+            dx[nc] = 0
+
+        x0[act] = xa
+        y0[act] = ya
+        act = act[np.abs(dx) > res[act]]
+    no_conv[act] = True
+
+    mindist = np.sqrt((nnx - x0) ** 2 + (nny - y0) ** 2)
+
+    for i in np.flatnonzero(no_conv):
+        mindist[i], x0[i], y0[i] = _mindist_r3p_sweep(
+            nnx[i], nny[i], a, b, c, res[i]
+        )
+
+    return (mindist, x0, y0)
+
+
 def mindist_r3p(nnx, nny, mmr3p, return_coords=False, res=1e-6):
     """
     Calcula la distancia en el plano de razones de movimientos medios
@@ -231,7 +403,7 @@ def mindist_r3p(nnx, nny, mmr3p, return_coords=False, res=1e-6):
     minima
     """
 
-    a, b, c = mmr3p
+    a, b, c = map(float, mmr3p)
 
     if (
         len(np.shape(nnx)) == 1
@@ -239,80 +411,29 @@ def mindist_r3p(nnx, nny, mmr3p, return_coords=False, res=1e-6):
         and np.shape(nnx) == np.shape(nny)
     ):
         array = True
-        N = len(nnx)
-        mindistll = []
-        x0l = []
-        y0l = []
     elif len(np.shape(nnx)) == 0 and len(np.shape(nny)) == 0:
         array = False
-        N = 1
     else:
         raise Exception("Fix shape of nnx and nny")
 
-    for i in range(N):
-        if array:
-            nnxi = nnx[i]
-            nnyi = nny[i]
+    if not array:
+        mindist, x0, y0 = _mindist_r3p_point(
+            float(nnx), float(nny), a, b, c, res
+        )
+        if return_coords:
+            return (mindist, x0, y0)
         else:
-            nnxi = nnx
-            nnyi = nny
-        x0 = nnxi - 0.5
-        y0 = r3p(x0, [a, b, c])
-
-        dx = 1
-        xstuck = None
-
-        singu = -b / a
-
-        while abs(dx) > res:
-            ac = a / c
-            ac2 = ac**2.0
-            ac3 = ac * ac2
-
-            g0 = -2 * nnxi + 2 * x0 + 2 * y0**3 * ac - 2 * nnyi * y0**2 * ac
-            d1g0 = 2 + 6 * ac2 * y0**4 - 4 * ac2 * nnyi * y0**3
-            d2g0 = 24 * ac3 * y0**5 - 12 * nnyi * ac3 * y0**4
-
-            dx = 2 * g0 * d1g0 / (2 * d1g0**2 - g0 * d2g0)
-
-            x0 = x0 - dx
-            y0 = r3p(x0, [a, b, c])
-
-            # solo calculo la distancia al ala izquierda de la resonancia
-            if (x0 >= singu) and (b != 0):
-                if x0 == xstuck:
-                    xstuck = "no_conv"
-                    break
-                if xstuck == "first_stuck_pass":
-                    xstuck = x0
-                if xstuck is None:
-                    xstuck = "first_stuck_pass"
-                x0 = singu - 5e-2
-                y0 = r3p(x0, [a, b, c])
-                dx = 1
-
-        if xstuck == "no_conv":
-            dom = np.linspace(1, singu - 1e-5, 1000000)
-            mindistl = np.sqrt(
-                (nnxi - dom) ** 2 + (nnyi - r3p(dom, [a, b, c])) ** 2
-            )
-            argmin = np.argmin(mindistl)
-            mindist = mindistl[argmin]
-            x0 = dom[argmin]
-            y0 = r3p(x0, [a, b, c])
-        else:
-            mindist = np.sqrt((nnxi - x0) ** 2 + (nnyi - y0) ** 2)
-
-        if not array:
-            if return_coords:
-                return (mindist, x0, y0)
-            else:
-                return mindist
-
-        mindistll.append(mindist)
-        x0l.append(x0)
-        y0l.append(y0)
+            return mindist
+
+    mindist, x0, y0 = _mindist_r3p_array(
+        np.asarray(nnx, dtype=float),
+        np.asarray(nny, dtype=float),
+        a,
+        b,
+        c,
+        np.broadcast_to(np.asarray(res, dtype=float), np.shape(nnx)),
+    )
     if return_coords:
-        return (mindistll, x0l, y0l)
+        return (mindist.tolist(), x0.tolist(), y0.tolist())
     else:
-        return mindistll
+        return mindist.tolist()